@@ -1,26 +1,52 @@
-import json
+import hashlib
 import os
 import re
 import string
+import threading
 import time
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from difflib import SequenceMatcher
+from functools import cache, lru_cache
 
 import firebase_admin
+import orjson
 import requests
 from firebase_admin import messaging
 from google.cloud import firestore
 from google.oauth2 import service_account
+from rapidfuzz import fuzz, process
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # -----------------
 # ENV VARIABLES
 # -----------------
 GAMERPOWER_API = "https://www.gamerpower.com/api/filter?type=game"
-SKIPPED_JSON_FILE = "skipped_games.json"
+SKIPPED_LOG_FILE = "skipped_games.jsonl"
+FREEBIES_JSON_FILE = "freebies.json"
+FIRESTORE_STATE_FILE = "firestore_state.json"
+IGDB_CACHE_FILE = "igdb_cache.json"
+GAMERPOWER_STATE_FILE = "gamerpower_state.json"
 
 IGDB_CLIENT_ID = os.getenv("IGDB_CLIENT_ID")
 IGDB_ACCESS_TOKEN = os.getenv("IGDB_ACCESS_TOKEN")
+IGDB_HEADERS = {
+    "Client-ID": IGDB_CLIENT_ID,
+    "Authorization": f"Bearer {IGDB_ACCESS_TOKEN}",
+}
+FCM_BATCH_SIZE = 500  # messaging.send_each accepts at most 500 messages
+FCM_MAX_WORKERS = 4
+
+IGDB_RATE_LIMIT = 4  # requests/second
+IGDB_MAX_WORKERS = 8  # IGDB allows up to 8 open requests at once
+IGDB_CACHE_TTL = 7 * 24 * 3600  # seconds
+IGDB_BATCH_SIZE = 10  # multiquery accepts at most 10 sub-queries
+IGDB_FIELDS = (
+    "id, name, cover.url, total_rating, storyline, first_release_date, "
+    "summary, genres.name, player_perspectives.name, game_engines.name, "
+    "game_modes.name, screenshots.url, websites.url, platforms"
+)
 
 FIREBASE_CREDENTIALS_JSON = os.getenv("FIREBASE_CREDENTIALS_JSON")
 FIRESTORE_PROJECT_ID = os.getenv("FIRESTORE_PROJECT_ID")
@@ -33,16 +59,42 @@ MANUAL_GAMES = [
 
 
 # -----------------
-# FIREBASE SETUP
+# FIREBASE SETUP (lazy, so importing the helpers needs no credentials)
 # -----------------
-firebase_cred_dict = json.loads(FIREBASE_CREDENTIALS_JSON)
-firebase_admin.initialize_app(firebase_admin.credentials.Certificate(firebase_cred_dict))
+@cache
+def get_firebase_credentials():
+    """Parse the service account JSON from the environment once."""
+    return orjson.loads(FIREBASE_CREDENTIALS_JSON)
+
+def init_firebase():
+    """Initialize the default firebase-admin app if it isn't already."""
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(firebase_admin.credentials.Certificate(get_firebase_credentials()))
 
 # -----------------
 # FIRESTORE CLIENT
 # -----------------
-credentials = service_account.Credentials.from_service_account_info(firebase_cred_dict)
-firestore_client = firestore.Client(project=FIRESTORE_PROJECT_ID, credentials=credentials)
+@cache
+def get_firestore_client():
+    """Create the Firestore client on first use."""
+    credentials = service_account.Credentials.from_service_account_info(get_firebase_credentials())
+    return firestore.Client(project=FIRESTORE_PROJECT_ID, credentials=credentials)
+
+# -----------------
+# HTTP SESSION (shared by GamerPower + IGDB calls)
+# -----------------
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    # IGDB queries are read-only POSTs, so they are safe to retry like GETs
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+    ),
+))
 
 # -----------------
 # HELPERS
@@ -52,110 +104,205 @@ _ROMAN_MAP = {
     "xi":"11","xii":"12","xiii":"13","xiv":"14","xv":"15","xvi":"16","xvii":"17","xviii":"18","xix":"19","xx":"20"
 }
 
-_EDITION_KEYWORDS = {
+_EDITION_KEYWORDS = frozenset({
     "remastered", "definitive", "goty", "complete", "hd",
     "ultimate", "anniversary", "collection", "trilogy", "bundle",
     "director", "redux", "reloaded", "remake"
-}
+})
 
+# "&" -> " and ", trademark symbols dropped, other punctuation -> space
+_TITLE_TRANS = str.maketrans({
+    **{ch: " " for ch in string.punctuation},
+    "&": " and ",
+    "™": None, "®": None, "©": None,
+})
+
+@lru_cache(maxsize=1024)
 def normalize_title(title: str) -> str:
     """Normalize game titles for strict equality checks."""
     if not title:
         return ""
-    t = unicodedata.normalize("NFKD", title)
-    t = "".join(ch for ch in t if not unicodedata.combining(ch))
-    t = t.lower()
-    t = t.replace("&", " and ")
-    t = re.sub(r"[™®©]", "", t)
-    t = re.sub(rf"[{re.escape(string.punctuation)}]", " ", t)
-    tokens = t.split()
-    tokens = [_ROMAN_MAP.get(tok, tok) for tok in tokens]
-    t = " ".join(tokens)
-    t = re.sub(r"\s+", " ", t).strip()
-    return t
-
-def is_confusing_match(gp_title: str, igdb_name: str) -> bool:
-    """Reject sequels/editions that GamerPower title didn't specify."""
-    gp_norm = normalize_title(gp_title)
-    igdb_norm = normalize_title(igdb_name)
-
-    gp_digits = re.findall(r"\d+", gp_norm)
-    igdb_digits = re.findall(r"\d+", igdb_norm)
-    if igdb_digits and not gp_digits:
+    t = title
+    if not t.isascii():  # ASCII is already NFKD with no combining marks
+        t = unicodedata.normalize("NFKD", t)
+        t = "".join(ch for ch in t if not unicodedata.combining(ch))
+    tokens = t.lower().translate(_TITLE_TRANS).split()
+    if _ROMAN_MAP.keys().isdisjoint(tokens):  # most titles have no numerals
+        return " ".join(tokens)
+    return " ".join(_ROMAN_MAP.get(tok, tok) for tok in tokens)
+
+_DIGITS_RE = re.compile(r"\d+")
+
+def is_confusing_match(gp_norm: str, igdb_norm: str) -> bool:
+    """Reject sequels/editions that GamerPower title didn't specify.
+
+    Both titles must already be passed through normalize_title.
+    """
+    # Numbered sequel on IGDB's side only
+    if _DIGITS_RE.search(igdb_norm) and not _DIGITS_RE.search(gp_norm):
         return True
 
-    for kw in _EDITION_KEYWORDS:
-        if kw in igdb_norm and kw not in gp_norm:
-            return True
-
-    return False
+    # Whole-word edition keywords only, so "hd" doesn't fire inside "withdrawal"
+    igdb_editions = _EDITION_KEYWORDS.intersection(igdb_norm.split())
+    return bool(igdb_editions.difference(gp_norm.split()))
+
+# (keyword, store, haystack searched), checked in priority order
+_STORE_RULES = (
+    ("steam", "Steam", "title+platforms"),
+    ("epic", "Epic Games Store", "title+platforms"),
+    ("gog", "GoG", "title+platforms"),
+    ("origin", "Origin", "title+platforms"),
+    ("indiegala", "IndieGala", "description+platforms"),
+    ("stove", "STOVE", "description+platforms"),
+    ("itch", "Itch.io", "description+platforms"),
+    ("drm-free", "DRM-Free", "platforms"),
+)
 
 def detect_store(offer):
     """Detect store from platforms/description/title."""
-    title = offer.get("title", "").lower()
+    title = (offer.get("title", "") or "").lower()
     desc = (offer.get("description", "") or "").lower()
     platforms = (offer.get("platforms", "") or "").lower()
-
-    if "steam" in title or "steam" in platforms:
-        return "Steam"
-    if "epic" in title or "epic" in platforms:
-        return "Epic Games Store"
-    if "gog" in title or "gog" in platforms:
-        return "GoG"
-    if "origin" in title or "origin" in platforms:
-        return "Origin"
-    if "indiegala" in desc or "indiegala" in platforms:
-        return "IndieGala"
-    if "stove" in desc or "stove" in platforms:
-        return "STOVE"
-    if "itch" in desc or "itch" in platforms:
-        return "Itch.io"
-    if "drm-free" in platforms:
-        return "DRM-Free"
+    # No keyword contains "\n", so one substring scan covers both joined fields
+    haystacks = {
+        "title+platforms": f"{title}\n{platforms}",
+        "description+platforms": f"{desc}\n{platforms}",
+        "platforms": platforms,
+    }
+    for kw, store, haystack in _STORE_RULES:
+        if kw in haystacks[haystack]:
+            return store
     return "Unknown"
 
+# GamerPower fields that always overwrite what's stored in Firestore
+_API_FIELDS = frozenset({"expiry_date", "worth", "store", "open_giveaway_url"})
+
+# IGDB platform IDs for Windows, Mac and Linux
+_PC_PLATFORM_IDS = frozenset({"6", "14", "92"})
+
+# Stored values that count as "not manually edited"
+_EMPTY_VALUES = (None, "", [], {})
+
 def merge_game_data(gp_game, igdb_data):
     """Merge IGDB + GamerPower data into final object."""
     merged = {**gp_game, **igdb_data}
     merged["open_giveaway_url"] = gp_game.get("open_giveaway_url")
     return merged
 
+def read_json_file(path, default):
+    """Load a local JSON file, falling back to default if missing or corrupt."""
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        return orjson.loads(raw) if raw.strip() else default
+    except orjson.JSONDecodeError:
+        return default
+
+def write_json_file(path, data):
+    """Write data to a local JSON file with 2-space indentation."""
+    # Serialize first so an unserializable value doesn't truncate the file
+    raw = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    with open(path, "wb") as f:
+        f.write(raw)
+
+def remove_file(path):
+    """Delete a local file if it exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+_skipped_buffer = []
+
 def append_skipped(game, reason):
-    """Log skipped games to file."""
-    entry = {**game, "reason": reason, "skipped_at": datetime.now(timezone.utc).isoformat()}
-    skipped = []
-    if os.path.exists(SKIPPED_JSON_FILE):
-        with open(SKIPPED_JSON_FILE, "r", encoding="utf-8") as f:
-            try:
-                skipped = json.load(f)
-            except:
-                skipped = []
-    skipped.append(entry)
-    with open(SKIPPED_JSON_FILE, "w", encoding="utf-8") as f:
-        json.dump(skipped, f, indent=2, ensure_ascii=False)
-
-def fetch_gamerpower_games():
-    """Fetch current free games from GamerPower API."""
+    """Queue a skipped game for the skip log (written by flush_skipped)."""
+    # list.append is atomic, so IGDB worker threads can call this freely
+    _skipped_buffer.append({**game, "reason": reason, "skipped_at": datetime.now(timezone.utc).isoformat()})
+
+def flush_skipped():
+    """Append all queued skipped games to the JSON Lines skip log."""
+    if not _skipped_buffer:
+        return
+    with open(SKIPPED_LOG_FILE, "ab") as f:
+        f.write(b"".join(orjson.dumps(entry) + b"\n" for entry in _skipped_buffer))
+    _skipped_buffer.clear()
+
+def load_igdb_cache():
+    """Load unexpired IGDB matches keyed by normalized title."""
+    now = time.time()
+    return {
+        norm: entry for norm, entry in read_json_file(IGDB_CACHE_FILE, {}).items()
+        if isinstance(entry, dict) and now - entry.get("fetched_at", 0) < IGDB_CACHE_TTL
+    }
+
+def save_igdb_cache(cache):
+    """Persist IGDB matches so later runs can skip the lookup."""
+    write_json_file(IGDB_CACHE_FILE, cache)
+
+_PAREN_RE = re.compile(r"\s*\(.*?\)")
+_GIVEAWAY_RE = re.compile(r"\s*Giveaway")
+
+# Offer fields this script reads; volatile ones (e.g. the "users" claim
+# count) are left out of the feed hash so they don't defeat it
+_FEED_HASH_FIELDS = (
+    "id", "title", "worth", "end_date", "platforms", "description",
+    "open_giveaway_url", "open_giveaway",
+)
+
+def hash_offers(offers):
+    """Hash the fields of the GamerPower offers that this script uses."""
+    relevant = sorted(
+        ({field: offer.get(field) for field in _FEED_HASH_FIELDS} for offer in offers),
+        key=lambda offer: str(offer["id"]),
+    )
+    return hashlib.blake2b(orjson.dumps(relevant, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+def fetch_gamerpower_games(validators=None):
+    """Fetch current free games from GamerPower API.
+
+    Returns (games, validators). games is None when the feed is unchanged
+    since the validators passed in: either a 304 for the ETag/Last-Modified
+    headers, or offers whose relevant fields hash to the previous value.
+    """
+    validators = validators or {}
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
     try:
-        resp = requests.get(GAMERPOWER_API, timeout=10)
+        resp = _session.get(GAMERPOWER_API, headers=headers, timeout=10)
+        if resp.status_code == 304:
+            return None, validators
         resp.raise_for_status()
-        offers = resp.json()
+        new_validators = {
+            key: value for key, value in (
+                ("etag", resp.headers.get("ETag")),
+                ("last_modified", resp.headers.get("Last-Modified")),
+            ) if value
+        }
+        offers = orjson.loads(resp.content)
+        # Fallback when the feed sends no usable validators: compare offer hashes
+        new_validators["content_hash"] = hash_offers(offers)
+        if new_validators["content_hash"] == validators.get("content_hash"):
+            return None, validators
         games = []
 
+        # Expiry for offers without an end date - 30 days from now
+        default_expiry = (datetime.now(timezone.utc) + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+
         for offer in offers:
             if "Key Giveaway" in offer["title"]:
                 continue
 
-            # Set expiry date - 30 days from now if not provided
             end_date = offer.get("end_date")
-            if not end_date or end_date == "N/A":
-                expiry_date = (datetime.utcnow() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
-            else:
-                expiry_date = end_date
+            expiry_date = default_expiry if not end_date or end_date == "N/A" else end_date
 
             # Clean title
-            clean_title = re.sub(r"\s*\(.*?\)", "", offer["title"])
-            clean_title = re.sub(r"\s*Giveaway", "", clean_title).strip()
+            clean_title = _PAREN_RE.sub("", offer["title"])
+            clean_title = _GIVEAWAY_RE.sub("", clean_title).strip()
 
             store = detect_store(offer)
             worth = offer.get("worth", "$0.00").replace("$", "").strip() or "0.00"
@@ -168,71 +315,150 @@ def fetch_gamerpower_games():
                 "expiry_date": expiry_date,
                 "open_giveaway_url": offer.get("open_giveaway_url") or offer.get("open_giveaway")
             })
-        return games
+        return games, new_validators
     except Exception as e:
         print(f"❌ Error fetching GamerPower data: {e}")
-        return []
-
-def fetch_igdb_data(title: str, normalized_target: str, gp_game: dict):
-    """Fetch game data from IGDB API with rate limiting."""
-    time.sleep(0.25)  # Rate limit: 4 requests/second max
-    
-    url = "https://api.igdb.com/v4/games"
-    headers = {
-        "Client-ID": IGDB_CLIENT_ID,
-        "Authorization": f"Bearer {IGDB_ACCESS_TOKEN}",
+        return [], {}
+
+_igdb_rate_lock = threading.Lock()
+_igdb_next_slot = 0.0
+
+def wait_for_igdb_slot():
+    """Block until the next IGDB request fits the shared rate limit."""
+    global _igdb_next_slot
+    with _igdb_rate_lock:
+        now = time.monotonic()
+        delay = _igdb_next_slot - now
+        _igdb_next_slot = max(now, _igdb_next_slot) + 1 / IGDB_RATE_LIMIT
+    if delay > 0:
+        time.sleep(delay)
+
+def has_pc_platform(raw_game):
+    """Check whether an IGDB game lists a PC platform (Windows, Mac or Linux)."""
+    return not _PC_PLATFORM_IDS.isdisjoint(map(str, raw_game.get("platforms", ())))
+
+def match_igdb_result(normalized_target: str, gp_game: dict, results: list):
+    """Pick the first strict, PC-compatible IGDB candidate for a GamerPower game."""
+    choices = {i: normalize_title(r.get("name", "") or "") for i, r in enumerate(results)}
+
+    # Exact normalized name: cannot be a confusing match, no fuzzy scoring needed
+    for i, r in enumerate(results):
+        if choices[i] == normalized_target and has_pc_platform(r):
+            return transform_igdb(r)
+
+    # Score every candidate in one C-level pass, keep IGDB's relevance order
+    fuzzy_hits = {
+        i for _, _, i in process.extract(
+            normalized_target, choices, scorer=fuzz.ratio, score_cutoff=90, limit=None
+        )
     }
-    body = f'''
+
+    for i, r in enumerate(results):
+        candidate_name = r.get("name", "") or ""
+        candidate_norm = choices[i]
+
+        if (
+            i in fuzzy_hits
+            or normalized_target in candidate_norm
+            or candidate_norm in normalized_target
+        ):
+            if is_confusing_match(normalized_target, candidate_norm):
+                append_skipped(gp_game, f"Confusing match with '{candidate_name}'")
+                continue
+
+            if not has_pc_platform(r):
+                append_skipped(gp_game, f"Non-PC platform match: {candidate_name}")
+                continue
+
+            return transform_igdb(r)
+
+    append_skipped(gp_game, "No strict safe IGDB match")
+    return {}
+
+def fetch_igdb_data_batch(gp_games: list):
+    """Fetch IGDB data for up to 10 games in one multiquery request.
+
+    Returns (matches, failed). failed is True when the request or a match
+    raised, as opposed to IGDB simply having no safe match.
+    """
+    wait_for_igdb_slot()  # Rate limit: 4 requests/second max across workers
+
+    url = "https://api.igdb.com/v4/multiquery"
+    queries = []
+    for i, gp_game in enumerate(gp_games):
+        # Escape backslashes first so a trailing backslash can't unquote the search string
+        title = gp_game["title"].replace("\\", "\\\\").replace('"', '\\"')
+        queries.append(f'''query games "{i}" {{
     search "{title}";
-    fields id, name, cover.url, total_rating, storyline, first_release_date,
-           summary, genres.name, player_perspectives.name, game_engines.name,
-           game_modes.name, screenshots.url, websites.url, platforms;
+    fields {IGDB_FIELDS};
     limit 25;
-    '''
+}};''')
+    body = "\n".join(queries)
     try:
-        resp = requests.post(url, headers=headers, data=body.strip(), timeout=10)
+        resp = _session.post(url, headers=IGDB_HEADERS, data=body, timeout=10)
         resp.raise_for_status()
-        results = resp.json() or []
-        
-        for r in results:
-            candidate_name = r.get("name", "") or ""
-            candidate_norm = normalize_title(candidate_name)
-
-            score = SequenceMatcher(
-                None,
-                normalized_target,
-                candidate_norm
-            ).ratio()
-
-            if (
-                score >= 0.90
-                or normalized_target in candidate_norm
-                or candidate_norm in normalized_target
-            ):  
-                if is_confusing_match(title, candidate_name):
-                    append_skipped(gp_game, f"Confusing match with '{candidate_name}'")
-                    continue
-                    
-                platforms = [str(p) for p in r.get("platforms", [])]
-                if not any(pid in platforms for pid in ("6", "14", "92")):
-                    append_skipped(gp_game, f"Non-PC platform match: {candidate_name}")
-                    continue
-                    
-                return transform_igdb(r)
-        
-        append_skipped(gp_game, "No strict safe IGDB match")
-        return {}
+        results_by_query = {q["name"]: q.get("result") or [] for q in orjson.loads(resp.content) or []}
     except Exception as e:
-        append_skipped(gp_game, f"IGDB fetch error: {e}")
-        return {}
+        for gp_game in gp_games:
+            append_skipped(gp_game, f"IGDB fetch error: {e}")
+        return [{} for _ in gp_games], True
+
+    matches = []
+    failed = False
+    for i, gp_game in enumerate(gp_games):
+        try:
+            gp_norm = normalize_title(gp_game["title"])
+            results = results_by_query.get(str(i), [])
+            matches.append(match_igdb_result(gp_norm, gp_game, results))
+        except Exception as e:
+            append_skipped(gp_game, f"IGDB match error: {e}")
+            matches.append({})
+            failed = True
+    return matches, failed
+
+def enrich_games(gp_games, igdb_cache):
+    """Fetch IGDB data in concurrent multiquery batches.
+
+    Returns (igdb_by_id, failed): IGDB data keyed by gamerpower_id, and
+    whether any batch hit a fetch or match error worth retrying.
+    """
+    # Same game offered on several stores -> one IGDB lookup per normalized title
+    to_fetch = {}
+    for gp_game in gp_games:
+        gp_norm = normalize_title(gp_game["title"])
+        if gp_norm in igdb_cache:
+            print(f"📦 Using cached IGDB data: {gp_game['title']}")
+        else:
+            print(f"🔎 Enriching game: {gp_game['title']}")
+            to_fetch.setdefault(gp_norm, []).append(gp_game)
+    unique_games = [same_title[0] for same_title in to_fetch.values()]
+    batches = [unique_games[i:i + IGDB_BATCH_SIZE] for i in range(0, len(unique_games), IGDB_BATCH_SIZE)]
+
+    failed = False
+    with ThreadPoolExecutor(max_workers=IGDB_MAX_WORKERS) as executor:
+        for batch, (batch_results, batch_failed) in zip(batches, executor.map(fetch_igdb_data_batch, batches)):
+            failed = failed or batch_failed
+            for gp_game, igdb_data in zip(batch, batch_results):
+                if igdb_data:
+                    igdb_cache[normalize_title(gp_game["title"])] = {
+                        "data": igdb_data,
+                        "fetched_at": time.time(),
+                    }
+
+    igdb_by_id = {
+        g["gamerpower_id"]: igdb_cache.get(normalize_title(g["title"]), {}).get("data", {})
+        for g in gp_games
+    }
+    return igdb_by_id, failed
+
+def _format_cover(url):
+    return "https:" + url.replace("t_thumb", "t_cover_big")
+
+def _format_screenshot(url):
+    return "https:" + url.replace("t_thumb", "t_screenshot_med")
 
 def transform_igdb(raw_game):
     """Transform IGDB raw data to our format."""
-    def format_cover(url):
-        return "https:" + url.replace("t_thumb", "t_cover_big")
-    def format_screenshot(url):
-        return "https:" + url.replace("t_thumb", "t_screenshot_med")
-    
     transformed = {
         "id": raw_game.get("id"),
         "name": raw_game.get("name"),
@@ -243,10 +469,10 @@ def transform_igdb(raw_game):
     }
     
     if "cover" in raw_game and raw_game["cover"].get("url"):
-        transformed["cover_url"] = format_cover(raw_game["cover"]["url"])
+        transformed["cover_url"] = _format_cover(raw_game["cover"]["url"])
     
     if "screenshots" in raw_game:
-        transformed["screenshots"] = [format_screenshot(s["url"]) for s in raw_game["screenshots"] if s.get("url")]
+        transformed["screenshots"] = [_format_screenshot(s["url"]) for s in raw_game["screenshots"] if s.get("url")]
     
     if "websites" in raw_game:
         transformed["websites"] = [w["url"] for w in raw_game["websites"] if w.get("url")]
@@ -257,18 +483,13 @@ def transform_igdb(raw_game):
     
     return transformed
 
-def is_expiring_today(expiry_date: str) -> bool:
-    """Check if expiry_date matches today's date (UTC)."""
-    try:
-        exp_date = datetime.fromisoformat(expiry_date.replace("Z", "+00:00"))
-    except ValueError:
-        return False
-    today = datetime.now(timezone.utc).date()
-    return exp_date.date() == today
+def is_expiring_today(expiry_date: str, today: str) -> bool:
+    """Check if expiry_date ("YYYY-MM-DD HH:MM:SS") falls on today ("YYYY-MM-DD")."""
+    return expiry_date[:10] == today
 
-def send_fcm_notification(game):
-    """Send FCM push notification for new free game."""
-    message = messaging.Message(
+def build_new_game_message(game):
+    """Build the FCM push notification for a new free game."""
+    return messaging.Message(
         topic="free_games",
         notification=messaging.Notification(
             title=f"{game['name']} Just Turned FREE!",
@@ -282,65 +503,152 @@ def send_fcm_notification(game):
             "click_action": "OPEN_GAME_PAGE"
         }
     )
+
+def send_messages(messages):
+    """Send FCM messages via send_each in concurrent 500-message chunks.
+
+    Returns one entry per message: None on success, else the exception.
+    """
+    def send_chunk(chunk):
+        try:
+            response = messaging.send_each(chunk)
+        except Exception as e:
+            return [e] * len(chunk)
+        return [None if result.success else result.exception for result in response.responses]
+
+    chunks = [messages[i:i + FCM_BATCH_SIZE] for i in range(0, len(messages), FCM_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=FCM_MAX_WORKERS) as executor:
+        return [error for chunk_errors in executor.map(send_chunk, chunks) for error in chunk_errors]
+
+def build_expiry_reminder_message(game):
+    """Build the FCM "last chance" notification for a game expiring today."""
+    return messaging.Message(
+        topic="free_games",
+        notification=messaging.Notification(
+            title=f"Last Chance for {game['name']}!",
+            body=f"Free offer ends TODAY on {game['store']}. Claim it now before it's gone forever!"
+        ),
+        data={
+            "game_name": game["name"],
+            "store": game["store"],
+            "expiry_date": game["expiry_date"],
+            "click_action": "OPEN_GAME_PAGE"
+        }
+    )
+
+def get_due_reminders(games, firestore_map):
+    """Return games expiring today that haven't had a reminder yet."""
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return [
+        game for game in games
+        if is_expiring_today(game["expiry_date"], today)
+        and not firestore_map.get(game["gamerpower_id"], {}).get("reminder_sent", False)
+    ]
+
+def send_notifications(new_games, expiring_games):
+    """Send new-game notifications and expiry reminders as one FCM batch."""
+    messages = [build_new_game_message(g) for g in new_games]
+    messages += [build_expiry_reminder_message(g) for g in expiring_games]
+    errors = send_messages(messages)
+
+    for game, error in zip(new_games, errors):
+        if error is None:
+            print(f"✅ Notification sent for {game['name']}")
+        else:
+            print(f"❌ Notification failed for {game['name']}: {error}")
+
+    for game, error in zip(expiring_games, errors[len(new_games):]):
+        if error is None:
+            print(f"⏰ Expiry reminder sent for {game['name']}")
+            game["reminder_sent"] = True
+        else:
+            print(f"❌ Expiry reminder failed for {game['name']}: {error}")
+
+def save_firestore_state(update_time):
+    """Record which Firestore version freebies.json mirrors."""
+    write_json_file(FIRESTORE_STATE_FILE, {"update_time": update_time.isoformat()})
+
+def save_local_snapshot(games, update_time):
+    """Mirror the Firestore games list to freebies.json with its update time (best-effort)."""
     try:
-        messaging.send(message)
-        print(f"✅ Notification sent for {game['name']}")
+        write_json_file(FREEBIES_JSON_FILE, games)
+        save_firestore_state(update_time)
     except Exception as e:
-        print(f"❌ Notification failed for {game['name']}: {e}")
-
-def send_expiry_reminders(games, firestore_games):
-    """Send reminder notifications for games expiring today."""
-    firestore_map = {g["gamerpower_id"]: g for g in firestore_games}
-    
-    for game in games:
-        if is_expiring_today(game["expiry_date"]):
-            old_entry = firestore_map.get(game["gamerpower_id"], {})
-            already_sent = old_entry.get("reminder_sent", False)
-            
-            if not already_sent:
-                message = messaging.Message(
-                    topic="free_games",
-                    notification=messaging.Notification(
-                        title=f"Last Chance for {game['name']}!",
-                        body=f"Free offer ends TODAY on {game['store']}. Claim it now before it's gone forever!"
-                    ),
-                    data={
-                        "game_name": game["name"],
-                        "store": game["store"],
-                        "expiry_date": game["expiry_date"],
-                        "click_action": "OPEN_GAME_PAGE"
-                    }
-                )
-                try:
-                    messaging.send(message)
-                    print(f"⏰ Expiry reminder sent for {game['name']}")
-                    game["reminder_sent"] = True
-                except Exception as e:
-                    print(f"❌ Expiry reminder failed for {game['name']}: {e}")
+        # Without a state file the next run simply does a full Firestore read
+        print(f"⚠️  Couldn't save local snapshot: {e}")
+        remove_file(FIRESTORE_STATE_FILE)
 
 def get_firestore_games():
-    """Fetch current games from Firestore."""
+    """Fetch current games from Firestore, reusing freebies.json if unchanged."""
     try:
-        firestore_doc = firestore_client.collection("all_freebies").document("games").get()
+        doc_ref = get_firestore_client().collection("all_freebies").document("games")
+
+        state = read_json_file(FIRESTORE_STATE_FILE, {})
+        if state.get("update_time") and os.path.exists(FREEBIES_JSON_FILE):
+            # Empty field mask: only metadata comes back, not the games array
+            meta = doc_ref.get(field_paths=[])
+            if meta.exists and meta.update_time.isoformat() == state["update_time"]:
+                snapshot = read_json_file(FREEBIES_JSON_FILE, [])
+                if snapshot:
+                    print("📦 Firestore unchanged since last run, using local snapshot")
+                    return snapshot
+                # Empty or unreadable snapshot: don't trust it, read the document
+
+        firestore_doc = doc_ref.get()
         if firestore_doc.exists:
             firestore_data = firestore_doc.to_dict() or {}
-            return firestore_data.get("games", [])
+            games = firestore_data.get("games", [])
+            save_local_snapshot(games, firestore_doc.update_time)
+            return games
         return []
     except Exception as e:
         print(f"❌ Firestore read failed: {e}")
         return []
 
 def update_firestore_games(games):
-    """Update games in Firestore."""
+    """Update games in Firestore. Returns True if the write succeeded."""
+    # Write the local snapshot alongside the Firestore round-trip; it only
+    # replaces freebies.json once Firestore has accepted the same list
+    tmp_snapshot = FREEBIES_JSON_FILE + ".tmp"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        snapshot_written = executor.submit(write_json_file, tmp_snapshot, games)
+        try:
+            result = get_firestore_client().collection("all_freebies").document("games").set({"games": games})
+            print(f"✅ Saved {len(games)} games to Firestore")
+        except Exception as e:
+            print(f"❌ Firestore write failed: {e}")
+            result = None
+
+    if result is None:
+        remove_file(tmp_snapshot)
+        return False
+    # Firestore has the new list either way; if the snapshot can't be saved,
+    # drop the state file so the next run does a full read instead
     try:
-        firestore_client.collection("all_freebies").document("games").set({"games": games})
-        print(f"✅ Saved {len(games)} games to Firestore")
+        snapshot_written.result()
+        os.replace(tmp_snapshot, FREEBIES_JSON_FILE)
+        save_firestore_state(result.update_time)
     except Exception as e:
-        print(f"❌ Firestore write failed: {e}")
+        print(f"⚠️  Couldn't save local snapshot: {e}")
+        remove_file(tmp_snapshot)
+        remove_file(FIRESTORE_STATE_FILE)
+    return True
+
+def save_feed_validators(validators, previous):
+    """Record the GamerPower feed validators, skipping the write if unchanged."""
+    if validators != previous:
+        write_json_file(GAMERPOWER_STATE_FILE, validators)
 
 def main():
+    init_firebase()
+
     print("🎮 Fetching GamerPower freebies...")
-    gp_games = fetch_gamerpower_games()
+    previous_validators = read_json_file(GAMERPOWER_STATE_FILE, {})
+    gp_games, feed_validators = fetch_gamerpower_games(previous_validators)
+    
+    if gp_games is None:
+        print("✨ GamerPower feed not modified since last run. Everything is up to date!")
+        return
     
     if not gp_games:
         print("⚠️  No games fetched from GamerPower. Exiting.")
@@ -352,15 +660,16 @@ def main():
     print("🔍 Fetching games from Firestore...")
     firestore_games = get_firestore_games()
     
-    # Compare IDs
-    firestore_ids = {g["gamerpower_id"] for g in firestore_games}
+    # Map of existing Firestore games, used for the ID diff and for preserving manual edits
+    firestore_map = {g["gamerpower_id"]: g for g in firestore_games}
     gp_ids = {g["gamerpower_id"] for g in gp_games}
     
-    added_ids = gp_ids - firestore_ids
-    removed_ids = firestore_ids - gp_ids
+    added_ids = gp_ids - firestore_map.keys()
+    removed_ids = firestore_map.keys() - gp_ids
     
     if not added_ids and not removed_ids:
         print("✨ No changes detected. Everything is up to date!")
+        save_feed_validators(feed_validators, previous_validators)
         return
     
     print(f"\n📊 Changes detected:")
@@ -369,71 +678,66 @@ def main():
     if removed_ids:
         print(f"  ➖ Removed: {len(removed_ids)} games")
     
-    # Create map of existing Firestore games for preserving manual edits
-    firestore_map = {g["gamerpower_id"]: g for g in firestore_games}
-    
+    # Fetch IGDB data for new games OR if existing game lacks IGDB data
+    to_enrich = []
+    for gp_game in gp_games:
+        gp_id = gp_game["gamerpower_id"]
+        existing = firestore_map.get(gp_id)
+        if gp_id in added_ids or (existing and (not existing.get("id") or not existing.get("name"))):
+            to_enrich.append(gp_game)
+    igdb_cache = load_igdb_cache()
+    igdb_by_id, igdb_failed = enrich_games(to_enrich, igdb_cache)
+    flush_skipped()
+    save_igdb_cache(igdb_cache)
+
     # Enrich games with IGDB data
     enriched_games = []
+    new_games = []
     for gp_game in gp_games:
         gp_id = gp_game["gamerpower_id"]
         
         # Check if this is a new game
         is_new_game = gp_id in added_ids
         
-        # Fetch IGDB data for new games OR if existing game lacks IGDB data
-        should_enrich = is_new_game
-        if gp_id in firestore_map:
-            existing = firestore_map[gp_id]
-            # Check if IGDB data is missing
-            if not existing.get("id") or not existing.get("name"):
-                should_enrich = True
+        existing = firestore_map.get(gp_id)
+        igdb_data = igdb_by_id.get(gp_id)
         
-        if should_enrich:
-            print(f"🔎 Enriching game: {gp_game['title']}")
-            gp_norm = normalize_title(gp_game["title"])
-            igdb_data = fetch_igdb_data(gp_game["title"], gp_norm, gp_game)
-            
+        if igdb_data is not None:
             if igdb_data:
                 merged_game = merge_game_data(gp_game, igdb_data)
                 
                 # If game existed, preserve manual edits
-                if gp_id in firestore_map:
-                    existing = firestore_map[gp_id]
-                    final_game = {}
-                    for key, value in merged_game.items():
-                        # Always refresh API fields
-                        if key in ["expiry_date", "worth", "store", "open_giveaway_url"]:
-                            final_game[key] = value
-                        # Preserve manual edits for other fields
-                        elif key in existing and existing[key] not in [None, "", [], {}]:
-                            final_game[key] = existing[key]
-                        else:
-                            final_game[key] = value
+                if existing is not None:
+                    # Always refresh API fields, preserve manual edits for the rest
+                    final_game = {
+                        key: value
+                        if key in _API_FIELDS or existing.get(key) in _EMPTY_VALUES
+                        else existing[key]
+                        for key, value in merged_game.items()
+                    }
                     enriched_games.append(final_game)
                 else:
                     # Completely new game
                     enriched_games.append(merged_game)
                 
-                # Send notification only for new games
+                # Notify only for new games
                 if is_new_game:
-                    send_fcm_notification(merged_game)
+                    new_games.append(merged_game)
             else:
                 print(f"⚠️  Skipped {gp_game['title']} (no IGDB match)")
         else:
             # Game exists and has IGDB data - just update API fields
-            existing = firestore_map[gp_id]
-            merged = {}
-            for key in existing.keys():
-                # Always refresh API fields
-                if key in gp_game and key in ["expiry_date", "worth", "store", "open_giveaway_url"]:
-                    merged[key] = gp_game[key]
-                else:
-                    merged[key] = existing[key]
+            merged = dict(existing)
+            for key in _API_FIELDS & existing.keys() & gp_game.keys():
+                merged[key] = gp_game[key]
             enriched_games.append(merged)
     
-    # Send expiry reminders before updating Firestore
+    # Send new-game notifications and expiry reminders before updating Firestore
     print("\n⏰ Checking for expiring games...")
-    send_expiry_reminders(enriched_games, firestore_games)
+    expiring_games = get_due_reminders(enriched_games, firestore_map)
+    if new_games or expiring_games:
+        print(f"📣 Sending {len(new_games)} new game notifications and {len(expiring_games)} expiry reminders...")
+        send_notifications(new_games, expiring_games)
     
     # Prepend manual games to the top of the array
     if MANUAL_GAMES:
@@ -442,8 +746,21 @@ def main():
     else:
         final_games = enriched_games
     
-    # Update Firestore with new list
-    update_firestore_games(final_games)
+    # Update Firestore with new list, unless nothing actually differs
+    # (e.g. the only "added" games were skipped for lack of an IGDB match)
+    if final_games == firestore_games:
+        print("✨ Firestore already matches the new list, skipping write")
+        saved = True
+    else:
+        saved = update_firestore_games(final_games)
+    
+    # Only remember the feed version once it's safely in Firestore and no
+    # IGDB lookup failed, otherwise a 304 on the next run would hide the
+    # failed update or the games that still need retrying
+    if saved and not igdb_failed:
+        save_feed_validators(feed_validators, previous_validators)
+    elif igdb_failed:
+        print("⚠️  Some IGDB lookups failed, they'll be retried next run")
     
     if removed_ids:
         print(f"🗑️  Removed {len(removed_ids)} expired games")